@@ -4,23 +4,35 @@ Wraps the LangGraph agent and provides HTTP endpoints
 """
 
 import asyncio
-import json
+import atexit
 import os
-from typing import Dict, Any, Optional
+import threading
+from typing import Any, Optional, Union
 from datetime import datetime
-from pathlib import Path
 
-from flask import Flask, request, jsonify
+import orjson
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from pydantic import ValidationError
-from dotenv import load_dotenv
+from shared.env import ensure_loaded
 
-from .models import ConversationRequest, ConversationResponse, AgentConfig
+from .models import ConversationRequest, AgentConfig
 from .graph import DigitalCloneAgent
+from .mcp_client import AVAILABLE_TOOLS
 
 # Load environment variables from .env file
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(env_path)
+ensure_loaded()
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson"""
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=str).decode()
+    
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return orjson.loads(s)
 
 
 class AgentAPIServer:
@@ -29,18 +41,30 @@ class AgentAPIServer:
     def __init__(self, config: Optional[AgentConfig] = None):
         self.config = config or AgentConfig()
         self.agent = DigitalCloneAgent(self.config)
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+        atexit.register(self.shutdown)
         self.app = Flask(__name__)
+        self.app.json = OrjsonProvider(self.app)
+        self._tools_payload = self._build_tools_payload()
+        self._config_payload = self._build_config_payload()
         CORS(self.app)  # Enable CORS for all routes
         self.setup_routes()
     
     def setup_routes(self):
         """Setup Flask routes"""
+        self.app.before_request(self._stamp_request)
         self._setup_health_route()
         self._setup_chat_route()
         self._setup_conversation_route()
         self._setup_config_routes()
         self._setup_tools_route()
     
+    def _stamp_request(self):
+        """Capture one timestamp per request for all handlers to share"""
+        g.timestamp = datetime.now()
+    
     def _setup_health_route(self):
         """Setup health check route"""
         @self.app.route('/health', methods=['GET'])
@@ -48,7 +72,7 @@ class AgentAPIServer:
             """Health check endpoint"""
             return jsonify({
                 "status": "healthy",
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": g.timestamp,
                 "agent_config": {
                     "model": "llama3:8b",
                     "temperature": self.config.temperature,
@@ -92,19 +116,19 @@ class AgentAPIServer:
     def _handle_chat_request(self):
         """Handle chat request"""
         try:
-            data = request.get_json()
-            if not data:
+            raw = request.get_data()
+            if not raw:
                 return jsonify({"error": "No JSON data provided"}), 400
             
-            chat_request = self._validate_chat_request(data)
-            response = self._process_chat_message(chat_request)
+            chat_request = self._validate_chat_request(raw)
+            response = self._run_async(self.agent.process_message(chat_request))
             
             return jsonify({
                 "response": response.response,
                 "conversation_id": response.conversation_id,
                 "tools_used": response.tools_used,
                 "metadata": response.metadata,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": g.timestamp
             })
             
         except ValidationError as e:
@@ -112,21 +136,16 @@ class AgentAPIServer:
         except Exception as e:
             return jsonify({
                 "error": f"Internal server error: {str(e)}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": g.timestamp
             }), 500
     
-    def _validate_chat_request(self, data):
-        """Validate chat request data"""
-        return ConversationRequest(**data)
+    def _validate_chat_request(self, raw):
+        """Parse and validate the raw chat request body in one pass"""
+        return ConversationRequest.model_validate_json(raw)
     
-    def _process_chat_message(self, chat_request):
-        """Process chat message asynchronously"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self.agent.process_message(chat_request))
-        finally:
-            loop.close()
+    def _run_async(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the persistent background event loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
     
     def _handle_get_conversation(self, conversation_id):
         """Handle get conversation request"""
@@ -134,24 +153,21 @@ class AgentAPIServer:
             return jsonify({
                 "conversation_id": conversation_id,
                 "message": "Conversation history retrieval not implemented yet",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": g.timestamp
             })
         except Exception as e:
             return jsonify({
                 "error": f"Error retrieving conversation: {str(e)}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": g.timestamp
             }), 500
     
     def _handle_get_config(self):
         """Handle get config request"""
-        return jsonify({
-            "model_name": self.config.model_name,
-            "temperature": self.config.temperature,
-            "max_tokens": self.config.max_tokens,
-            "system_prompt": self.config.system_prompt,
-            "enable_tools": self.config.enable_tools,
-            "mcp_server_url": self.config.mcp_server_url
-        })
+        return Response(self._config_payload, mimetype='application/json')
+    
+    def _build_config_payload(self) -> bytes:
+        """Serialize the current config once for reuse by GET /config"""
+        return orjson.dumps(self._get_config_dict())
     
     def _handle_update_config(self):
         """Handle update config request"""
@@ -160,27 +176,38 @@ class AgentAPIServer:
             if not data:
                 return jsonify({"error": "No JSON data provided"}), 400
             
-            self._update_config_fields(data)
-            self.agent = DigitalCloneAgent(self.config)
+            changed = self._update_config_fields(data)
+            self._apply_config_changes(changed)
+            self._config_payload = self._build_config_payload()
             
             return jsonify({
                 "message": "Configuration updated successfully",
                 "config": self._get_config_dict(),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": g.timestamp
             })
             
         except Exception as e:
             return jsonify({
                 "error": f"Error updating configuration: {str(e)}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": g.timestamp
             }), 500
     
     def _update_config_fields(self, data):
-        """Update config fields from request data"""
+        """Update config fields from request data and return the names that changed"""
         allowed_fields = ['temperature', 'max_tokens', 'system_prompt', 'enable_tools']
+        changed = set()
         for field in allowed_fields:
-            if field in data:
+            if field in data and getattr(self.config, field) != data[field]:
                 setattr(self.config, field, data[field])
+                changed.add(field)
+        return changed
+    
+    def _apply_config_changes(self, changed):
+        """Apply changed config fields to the live agent"""
+        # The agent shares self.config, so system_prompt, max_tokens and
+        # enable_tools are picked up on the next turn; only the LLM needs patching
+        if "temperature" in changed:
+            self.agent.llm.temperature = self.config.temperature
     
     def _get_config_dict(self):
         """Get config as dictionary"""
@@ -195,63 +222,25 @@ class AgentAPIServer:
     
     def _handle_get_tools(self):
         """Handle get tools request"""
-        try:
-            tools = self._get_available_tools_list()
-            return jsonify({
-                "tools": tools,
-                "count": len(tools),
-                "timestamp": datetime.now().isoformat()
-            })
-        except Exception as e:
-            return jsonify({
-                "error": f"Error retrieving tools: {str(e)}",
-                "timestamp": datetime.now().isoformat()
-            }), 500
+        return Response(self._tools_payload, mimetype='application/json')
+    
+    def _build_tools_payload(self) -> bytes:
+        """Serialize the static tools list once for reuse by GET /tools"""
+        tools = self._get_available_tools_list()
+        return orjson.dumps({"tools": tools, "count": len(tools)})
     
     def _get_available_tools_list(self):
         """Get list of available tools"""
-        return [
-            {
-                "name": "web_search",
-                "description": "Search the web for information",
-                "parameters": {"query": {"type": "string", "description": "Search query"}}
-            },
-            {
-                "name": "read_file",
-                "description": "Read contents of a file",
-                "parameters": {"file_path": {"type": "string", "description": "Path to file"}}
-            },
-            {
-                "name": "write_file",
-                "description": "Write content to a file",
-                "parameters": {
-                    "file_path": {"type": "string", "description": "Path to file"},
-                    "content": {"type": "string", "description": "Content to write"}
-                }
-            },
-            {
-                "name": "list_directory",
-                "description": "List contents of a directory",
-                "parameters": {"directory_path": {"type": "string", "description": "Path to directory"}}
-            },
-            {
-                "name": "calculate",
-                "description": "Safely evaluate mathematical expressions",
-                "parameters": {"expression": {"type": "string", "description": "Mathematical expression"}}
-            },
-            {
-                "name": "get_system_info",
-                "description": "Get current system information",
-                "parameters": {}
-            },
-            {
-                "name": "transcribe_audio",
-                "description": "Transcribe audio from a .wav file using OpenAI's Whisper API",
-                "parameters": {
-                    "file_path": {"type": "string", "description": "Path to the .wav audio file"}
-                }
-            }
-        ]
+        return AVAILABLE_TOOLS
+    
+    def shutdown(self):
+        """Close agent connections and stop the background event loop"""
+        if not self._loop.is_running():
+            return
+        try:
+            self._run_async(self.agent.aclose(), timeout=5)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
     
     def run(self, host: str = "localhost", port: int = 8002, debug: bool = False):
         """Run the Flask server"""
@@ -260,13 +249,12 @@ class AgentAPIServer:
         print(f"MCP server URL: {self.config.mcp_server_url}")
         print(f"Tools enabled: {self.config.enable_tools}")
         
-        self.app.run(host=host, port=port, debug=debug)
+        self.app.run(host=host, port=port, debug=debug, threaded=True)
 
 
-def main():
-    """Main entry point for the API server"""
-    # Load configuration from environment variables
-    config = AgentConfig(
+def config_from_env() -> AgentConfig:
+    """Load agent configuration from environment variables"""
+    return AgentConfig(
         model_name=os.getenv("AGENT_MODEL", "llama3:8b"),
         temperature=float(os.getenv("AGENT_TEMPERATURE", "0.7")),
         max_tokens=int(os.getenv("AGENT_MAX_TOKENS", "1000")),
@@ -274,8 +262,22 @@ def main():
         enable_tools=os.getenv("AGENT_ENABLE_TOOLS", "true").lower() == "true",
         mcp_server_url=os.getenv("MCP_SERVER_URL", "http://localhost:8001")
     )
+
+
+def app_factory() -> Flask:
+    """
+    WSGI application factory for production servers, e.g.
+    gunicorn -k gthread --threads 16 -w 1 -b localhost:8002 'agent.api:app_factory()'
     
-    server = AgentAPIServer(config)
+    Use a single worker: conversation checkpoints and caches are held in process
+    memory, so additional workers would each see a different set of conversations.
+    """
+    return AgentAPIServer(config_from_env()).app
+
+
+def main():
+    """Main entry point for the API server"""
+    server = AgentAPIServer(config_from_env())
     server.run(debug=True)
 
 
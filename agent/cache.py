@@ -0,0 +1,76 @@
+"""
+Response caches for the Digital Clone agent
+"""
+
+import hashlib
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .models import ConversationResponse, Message
+
+
+def hash_key(*parts: str) -> bytes:
+    """Build a stable, compact cache key from a sequence of strings"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.digest()
+
+
+class SemanticCache:
+    """Bounded in-process cache of responses matched by message embedding similarity"""
+    
+    def __init__(self, threshold: float = 0.92, maxsize: int = 256):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        # Ring buffer of unit-length embeddings, allocated once the embedding size is known
+        self._vectors: Optional[np.ndarray] = None
+        self._keys: List[Optional[bytes]] = [None] * maxsize
+        self._responses: List[Optional[ConversationResponse]] = [None] * maxsize
+        self._next = 0
+    
+    @staticmethod
+    def context_key(messages: Sequence[Message], size: int = 2) -> bytes:
+        """Hash the system prompt and the user messages that precede the incoming one.
+
+        Assistant replies are sampled and differ between runs, so keying on them would
+        almost never repeat; first turns share the system prompt's key across conversations.
+        """
+        parts = [f"system:{msg.content}" for msg in messages[:1] if msg.role == "system"]
+        user_messages = [msg.content for msg in messages if msg.role == "user"]
+        parts.extend(f"user:{content}" for content in user_messages[-size:])
+        return hash_key(*parts)
+    
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        """Scale an embedding to unit length so cosine similarity is a dot product"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector)) or 1.0
+        return vector / norm
+    
+    def get(self, context_key: bytes, embedding: Sequence[float]) -> Optional[ConversationResponse]:
+        """Return the closest cached response for the same conversation context, if similar enough"""
+        if self._vectors is None or len(embedding) != self._vectors.shape[1]:
+            return None
+        rows = [i for i, key in enumerate(self._keys) if key == context_key]
+        if not rows:
+            return None
+        scores = self._vectors[rows] @ self._normalize(embedding)
+        best = int(np.argmax(scores))
+        return self._responses[rows[best]] if scores[best] >= self.threshold else None
+    
+    def put(self, context_key: bytes, embedding: Sequence[float], response: ConversationResponse):
+        """Store a response, overwriting the oldest entry once the cache is full"""
+        vector = self._normalize(embedding)
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            # First entry, or the embedding model changed: start over at the new size
+            self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            self._keys = [None] * self.maxsize
+            self._responses = [None] * self.maxsize
+            self._next = 0
+        self._vectors[self._next] = vector
+        self._keys[self._next] = context_key
+        self._responses[self._next] = response
+        self._next = (self._next + 1) % self.maxsize
@@ -3,26 +3,47 @@ LangGraph Multi-Agent System for Digital Clone
 Uses local Ollama model (llama3:8b) and integrates with MCP server
 """
 
-import asyncio
-import json
+import itertools
+import re
+import time
 import uuid
-from typing import Any, Dict, List, Optional, Tuple, TypedDict
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
+import msgspec
+from cachetools import LRUCache
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_community.embeddings import OllamaEmbeddings
 from langchain_community.llms import Ollama
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from langgraph.checkpoint.memory import MemorySaver
 
 from .models import (
-    AgentState, Message, ToolResult, ConversationRequest, 
-    ConversationResponse, AgentConfig
+    AgentState, Message, ConversationRequest, 
+    ConversationResponse, AgentConfig, AnalysisPlan
 )
-from .mcp_client import MCPClient, MockMCPClient
+from .mcp_client import AVAILABLE_TOOLS, MCPClient, MockMCPClient
+from .cache import SemanticCache, hash_key
+
+# Words of three or more letters, used for lightweight topic extraction
+_WORD_RE = re.compile(r"[A-Za-z]{3,}")
+
+# How long a health probe result is trusted before the MCP server is probed again
+MCP_HEALTHY_TTL = 30.0
+MCP_UNHEALTHY_TTL = 5.0
+
+# Most recent tool names kept in agent_memory["tools_used"]
+MAX_TRACKED_TOOLS = 50
+
+# Parameter a bare (non-object) tool argument from the analysis is passed as; only
+# tools taking exactly one parameter can accept one unambiguously
+_BARE_ARGUMENT_NAMES = {
+    tool["name"]: next(iter(tool["parameters"]))
+    for tool in AVAILABLE_TOOLS
+    if len(tool["parameters"]) == 1
+}
 
 
 class DigitalCloneAgent:
@@ -36,9 +57,61 @@ class DigitalCloneAgent:
             base_url="http://localhost:11434"
         )
         self.mcp_client = MCPClient(config.mcp_server_url)
+        self._upstream_mcp_client = self.mcp_client
+        self._mcp_recheck_at = 0.0
         self.memory = MemorySaver()
+        # Only needed for the semantic cache, which costs an embedding call per turn
+        self.embeddings = OllamaEmbeddings(
+            model=config.semantic_cache_embedding_model,
+            base_url="http://localhost:11434"
+        ) if config.enable_semantic_cache else None
+        self._semantic_cache = SemanticCache(
+            threshold=config.semantic_cache_threshold,
+            maxsize=config.semantic_cache_size
+        )
+        self._analyze_chain = self._make_analyze_prompt() | self.llm | RunnableLambda(self._parse_analysis)
+        self._response_chain = self._make_response_prompt() | self.llm
+        self._analyze_lru = LRUCache(maxsize=1024)
         self.graph = self._build_graph()
     
+    def _make_analyze_prompt(self) -> ChatPromptTemplate:
+        """Build the prompt used to analyze user messages and plan the response in one call"""
+        return ChatPromptTemplate.from_messages([
+            ("system", """You are an AI assistant that analyzes user messages and plans the response. Determine:
+1. The user's intent
+2. Whether tools are needed, and if so which tools and how to use them
+3. The type of response required and how to structure it
+
+Respond with a single JSON object containing:
+- intent: string (e.g., "question", "task", "conversation")
+- needs_tools: boolean
+- response_type: string (e.g., "informative", "action", "conversational")
+- priority: string (e.g., "high", "medium", "low")
+- plan: string (description of the plan)
+- tools_to_use: list of tool names (if any)
+- tool_arguments: dict of tool arguments keyed by tool name (if any)
+- response_strategy: string (how to structure the response)
+"""),
+            ("user", """Messages:
+{messages}
+
+Analyze the last message and create a response plan.""")
+        ])
+    
+    def _make_response_prompt(self) -> ChatPromptTemplate:
+        """Build the prompt used to generate the final response"""
+        return ChatPromptTemplate.from_messages([
+            ("system", """You are a helpful AI assistant. Use the following context to provide a relevant and helpful response.
+
+Context:
+{context}
+
+Respond naturally and conversationally. If tools were used, incorporate their results into your response.
+If no tools were used, provide a helpful response based on the user's message."""),
+            MessagesPlaceholder(variable_name="messages"),
+            ("user", "Generate a helpful response based on the conversation and context.")
+        ])
+    
     def _build_graph(self) -> StateGraph:
         """Build the LangGraph workflow"""
         
@@ -46,55 +119,118 @@ class DigitalCloneAgent:
         workflow = StateGraph(AgentState)
         
         # Add nodes
-        workflow.add_node("analyze", self._analyze_message)
-        workflow.add_node("plan", self._plan_response)
+        workflow.add_node("analyze_and_plan", self._analyze_message)
         workflow.add_node("execute_tools", self._execute_tools)
         workflow.add_node("generate_response", self._generate_response)
         workflow.add_node("update_memory", self._update_memory)
         
         # Define the workflow
-        workflow.set_entry_point("analyze")
-        workflow.add_edge("analyze", "plan")
-        workflow.add_edge("plan", "execute_tools")
+        workflow.set_entry_point("analyze_and_plan")
+        workflow.add_conditional_edges(
+            "analyze_and_plan",
+            self._route_after_analysis,
+            {"execute_tools": "execute_tools", "generate_response": "generate_response"}
+        )
         workflow.add_edge("execute_tools", "generate_response")
         workflow.add_edge("generate_response", "update_memory")
         workflow.add_edge("update_memory", END)
         
         return workflow.compile(checkpointer=self.memory)
     
+    @staticmethod
+    def _parse_analysis(output: Any) -> AnalysisPlan:
+        """Decode and validate the JSON object in the LLM output"""
+        text = output.content if hasattr(output, 'content') else str(output)
+        # The model sometimes wraps the object in prose or a code fence
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end < start:
+            raise ValueError("No JSON object found in analysis output")
+        result = msgspec.json.decode(text[start:end + 1], type=AnalysisPlan, strict=False)
+        return DigitalCloneAgent._normalize_analysis(result)
+    
+    @staticmethod
+    def _normalize_analysis(result: AnalysisPlan) -> AnalysisPlan:
+        """Coerce loosely shaped analysis fields into the types the graph expects"""
+        defaults = AnalysisPlan()
+        for field in ("intent", "response_type", "priority", "plan", "response_strategy"):
+            value = getattr(result, field)
+            if isinstance(value, (list, tuple)):
+                value = "\n".join(str(item) for item in value if item is not None)
+            elif value is not None and not isinstance(value, str):
+                value = str(value)
+            setattr(result, field, value or getattr(defaults, field))
+        
+        needs_tools = result.needs_tools
+        if isinstance(needs_tools, str):
+            needs_tools = needs_tools.strip().lower() in ("true", "yes", "1")
+        result.needs_tools = bool(needs_tools)
+        
+        tools = result.tools_to_use
+        if isinstance(tools, str):
+            tools = [tools]
+        elif isinstance(tools, dict):
+            tools = list(tools)
+        elif not isinstance(tools, (list, tuple)):
+            tools = []
+        result.tools_to_use = [str(tool) for tool in tools if tool]
+        
+        arguments = result.tool_arguments if isinstance(result.tool_arguments, dict) else {}
+        normalized = {}
+        for tool_name, value in arguments.items():
+            if value is None:
+                value = {}
+            elif not isinstance(value, dict):
+                parameter = _BARE_ARGUMENT_NAMES.get(tool_name)
+                value = {parameter: value} if parameter else {}
+            normalized[tool_name] = value
+        result.tool_arguments = normalized
+        return result
+    
+    def _route_after_analysis(self, state: AgentState) -> str:
+        """Skip tool execution when the analysis does not call for any tools"""
+        analysis = state["context"].get("analysis", {})
+        plan = state["context"].get("plan", {})
+        if self.config.enable_tools and analysis.get("needs_tools") and plan.get("tools_to_use"):
+            return "execute_tools"
+        return "generate_response"
+    
     async def _analyze_message(self, state: AgentState) -> AgentState:
-        """Analyze the user message and determine intent"""
+        """Analyze the user message and plan the response with a single LLM call"""
         messages = state["messages"]
         last_message = messages[-1] if messages else None
+        # Results from a previous turn must not leak into this one when tools are skipped
+        state["tools_results"] = []
         
         if not last_message or last_message.role != "user":
             return state
         
-        # Analyze the message content
-        analysis_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an AI assistant that analyzes user messages to determine:
-1. The user's intent
-2. Whether tools are needed
-3. The type of response required
-
-Respond with a JSON object containing:
-- intent: string (e.g., "question", "task", "conversation")
-- needs_tools: boolean
-- tool_requirements: list of required tools (if any)
-- response_type: string (e.g., "informative", "action", "conversational")
-- priority: string (e.g., "high", "medium", "low")
-"""),
-            ("user", "Analyze this message: {message}")
-        ])
-        
-        chain = analysis_prompt | self.llm | JsonOutputParser()
-        
         try:
-            analysis = await chain.ainvoke({"message": last_message.content})
-            state["context"]["analysis"] = analysis
-            state["current_task"] = analysis.get("intent", "conversation")
+            # Last 3 messages as compact "role: content" lines rather than a Python list repr
+            transcript = "\n".join(
+                f"{role}: {content}" for role, content in self._window_messages(messages, 3)
+            )
+            key = hash_key(transcript)
+            result = self._analyze_lru.get(key)
+            if result is None:
+                result = await self._analyze_chain.ainvoke({"messages": transcript})
+                self._analyze_lru[key] = result
+            
+            state["context"]["analysis"] = {
+                "intent": result.intent,
+                "needs_tools": result.needs_tools,
+                "tool_requirements": result.tools_to_use,
+                "response_type": result.response_type,
+                "priority": result.priority
+            }
+            state["context"]["plan"] = {
+                "plan": result.plan,
+                "tools_to_use": result.tools_to_use,
+                "tool_arguments": result.tool_arguments,
+                "response_strategy": result.response_strategy
+            }
+            state["current_task"] = result.intent
         except Exception as e:
-            # Fallback analysis
+            # Fallback analysis and plan
             state["context"]["analysis"] = {
                 "intent": "conversation",
                 "needs_tools": False,
@@ -102,49 +238,13 @@ Respond with a JSON object containing:
                 "response_type": "conversational",
                 "priority": "medium"
             }
-            state["current_task"] = "conversation"
-        
-        return state
-    
-    async def _plan_response(self, state: AgentState) -> AgentState:
-        """Plan the response based on analysis"""
-        analysis = state["context"].get("analysis", {})
-        messages = state["messages"]
-        
-        planning_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an AI assistant that plans responses. Based on the analysis, create a plan for responding to the user.
-
-If tools are needed, specify which tools and how to use them.
-If no tools are needed, plan a direct response.
-
-Respond with a JSON object containing:
-- plan: string (description of the plan)
-- tools_to_use: list of tool names (if any)
-- tool_arguments: dict of tool arguments (if any)
-- response_strategy: string (how to structure the response)
-"""),
-            ("user", """Analysis: {analysis}
-Messages: {messages}
-
-Create a response plan.""")
-        ])
-        
-        chain = planning_prompt | self.llm | JsonOutputParser()
-        
-        try:
-            plan = await chain.ainvoke({
-                "analysis": json.dumps(analysis),
-                "messages": [msg.content for msg in messages[-3:]]  # Last 3 messages
-            })
-            state["context"]["plan"] = plan
-        except Exception as e:
-            # Fallback plan
             state["context"]["plan"] = {
                 "plan": "Provide a helpful response",
                 "tools_to_use": [],
                 "tool_arguments": {},
                 "response_strategy": "conversational"
             }
+            state["current_task"] = "conversation"
         
         return state
     
@@ -165,40 +265,41 @@ Create a response plan.""")
     
     async def _ensure_mcp_client(self):
         """Ensure MCP client is available, fallback to mock if needed"""
+        now = time.monotonic()
+        if now < self._mcp_recheck_at:
+            return
+        
         try:
-            is_healthy = await self.mcp_client.health_check()
-            if not is_healthy:
-                print("MCP server not available, using mock client")
-                self.mcp_client = MockMCPClient()
+            is_healthy = await self._upstream_mcp_client.health_check()
         except Exception:
+            is_healthy = False
+        
+        if is_healthy:
+            self.mcp_client = self._upstream_mcp_client
+            self._mcp_recheck_at = now + MCP_HEALTHY_TTL
+        else:
             print("MCP server not available, using mock client")
-            self.mcp_client = MockMCPClient()
+            if not isinstance(self.mcp_client, MockMCPClient):
+                self.mcp_client = MockMCPClient()
+            self._mcp_recheck_at = now + MCP_UNHEALTHY_TTL
+    
+    async def aclose(self):
+        """Release the pooled HTTP connections"""
+        await self._upstream_mcp_client.aclose()
     
     async def _execute_tool_list(self, tools_to_use: List[str], tool_arguments: Dict) -> List[Dict]:
-        """Execute a list of tools"""
-        results = []
-        for tool_name in tools_to_use:
-            result = await self._execute_single_tool(tool_name, tool_arguments.get(tool_name, {}))
-            results.append(result)
-        return results
-    
-    async def _execute_single_tool(self, tool_name: str, args: Dict) -> Dict:
-        """Execute a single tool"""
-        try:
-            result = await self.mcp_client.execute_tool(tool_name, **args)
-            return {
-                "tool": tool_name,
+        """Execute a list of tools concurrently, preserving their order"""
+        calls = [(tool_name, tool_arguments.get(tool_name) or {}) for tool_name in tools_to_use]
+        results = await self.mcp_client.execute_tools(calls)
+        return [
+            {
+                "tool": result.tool_name,
                 "success": result.success,
                 "result": result.result,
                 "error": result.error
             }
-        except Exception as e:
-            return {
-                "tool": tool_name,
-                "success": False,
-                "result": None,
-                "error": str(e)
-            }
+            for result in results
+        ]
     
     async def _generate_response(self, state: AgentState) -> AgentState:
         """Generate the final response"""
@@ -207,7 +308,7 @@ Create a response plan.""")
         
         try:
             response_content = await self._generate_response_content(context, lc_messages)
-            response_message = self._create_response_message(response_content, state["tools_results"])
+            response_message = self._create_response_message(response_content, state.get("tools_results") or [])
             state["messages"].append(response_message)
         except Exception as e:
             fallback_message = self._create_fallback_message(str(e))
@@ -220,7 +321,7 @@ Create a response plan.""")
         context_parts = []
         analysis = state["context"].get("analysis", {})
         plan = state["context"].get("plan", {})
-        tools_results = state["tools_results"]
+        tools_results = state.get("tools_results") or []
         
         if analysis:
             context_parts.append(f"Intent: {analysis.get('intent', 'conversation')}")
@@ -244,40 +345,41 @@ Create a response plan.""")
                 summary.append(f"{result['tool']}: Failed - {result['error']}")
         return summary
     
+    def _window_messages(self, messages: List[Message], max_messages: int) -> List[Tuple[str, str]]:
+        """Select the most recent messages that fit within the history character budget"""
+        budget = self.config.max_history_chars
+        window = []
+        for msg in reversed(messages[-max_messages:]):
+            if budget <= 0:
+                break
+            # Keep the tail of an oversized boundary message, where the latest content is
+            content = msg.content if len(msg.content) <= budget else msg.content[-budget:]
+            window.append((msg.role, content))
+            budget -= len(content)
+        window.reverse()
+        return window
+    
     def _convert_messages_to_langchain(self, messages: List[Message]) -> List:
         """Convert messages to LangChain format"""
         lc_messages = []
-        for msg in messages[-5:]:  # Last 5 messages for context
-            if msg.role == "user":
-                lc_messages.append(HumanMessage(content=msg.content))
-            elif msg.role == "assistant":
-                lc_messages.append(AIMessage(content=msg.content))
-            elif msg.role == "system":
-                lc_messages.append(SystemMessage(content=msg.content))
+        for role, content in self._window_messages(messages, 5):  # Last 5 messages for context
+            if role == "user":
+                lc_messages.append(HumanMessage(content=content))
+            elif role == "assistant":
+                lc_messages.append(AIMessage(content=content))
+            elif role == "system":
+                lc_messages.append(SystemMessage(content=content))
         return lc_messages
     
     async def _generate_response_content(self, context: str, lc_messages: List) -> str:
         """Generate response content using LLM"""
-        response_prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are a helpful AI assistant. Use the following context to provide a relevant and helpful response.
-
-Context:
-{context}
-
-Respond naturally and conversationally. If tools were used, incorporate their results into your response.
-If no tools were used, provide a helpful response based on the user's message."""),
-            MessagesPlaceholder(variable_name="messages"),
-            ("user", "Generate a helpful response based on the conversation and context.")
-        ])
-        
-        chain = response_prompt | self.llm
-        response = await chain.ainvoke({"messages": lc_messages})
+        response = await self._response_chain.ainvoke({"context": context, "messages": lc_messages})
         return response.content if hasattr(response, 'content') else str(response)
     
     def _create_response_message(self, content: str, tools_results: List[Dict]) -> Message:
         """Create response message"""
         tools_used = [r["tool"] for r in tools_results if r["success"]]
-        return Message(
+        return Message.model_construct(
             role="assistant",
             content=content,
             metadata={"tools_used": tools_used}
@@ -285,7 +387,7 @@ If no tools were used, provide a helpful response based on the user's message.""
     
     def _create_fallback_message(self, error: str) -> Message:
         """Create fallback error message"""
-        return Message(
+        return Message.model_construct(
             role="assistant",
             content="I apologize, but I encountered an error while processing your request. Please try again.",
             metadata={"error": error}
@@ -294,63 +396,113 @@ If no tools were used, provide a helpful response based on the user's message.""
     async def _update_memory(self, state: AgentState) -> AgentState:
         """Update agent memory with conversation context"""
         messages = state["messages"]
+        memory = state["agent_memory"]
         
-        # Extract key information for memory
-        memory_update = {
-            "last_interaction": datetime.now().isoformat(),
-            "conversation_length": len(messages),
-            "recent_topics": [],
-            "tools_used": []
-        }
+        memory["last_interaction"] = datetime.now().isoformat()
+        memory["conversation_length"] = len(messages)
         
         # Extract recent topics from messages
-        recent_messages = messages[-3:]
-        for msg in recent_messages:
+        topics = {}
+        for msg in messages[-3:]:
             if msg.role == "user":
-                # Simple keyword extraction (could be enhanced)
-                words = msg.content.lower().split()
-                memory_update["recent_topics"].extend(words[:5])  # First 5 words as topics
+                # Simple keyword extraction (could be enhanced); first 5 words as topics
+                words = itertools.islice(_WORD_RE.finditer(msg.content), 5)
+                topics.update(dict.fromkeys(match.group(0).lower() for match in words))
+        memory["recent_topics"] = list(topics)
         
-        # Track tools used
-        for msg in messages:
-            if msg.metadata and "tools_used" in msg.metadata:
-                memory_update["tools_used"].extend(msg.metadata["tools_used"])
+        # Track tools used; only the newest assistant message can add to the running list
+        tools_used = memory.setdefault("tools_used", [])
+        last_message = messages[-1] if messages else None
+        if last_message and last_message.metadata and last_message.metadata.get("tools_used"):
+            tools_used.extend(last_message.metadata["tools_used"])
+            # Keep only the most recent entries so long conversations do not grow memory unbounded
+            del tools_used[:-MAX_TRACKED_TOOLS]
         
-        state["agent_memory"].update(memory_update)
         return state
     
     async def process_message(self, request: ConversationRequest) -> ConversationResponse:
         """Process a user message and return a response"""
         state = await self._get_or_create_state(request)
+        cache_key = await self._semantic_cache_key(state, request)
+        if cache_key:
+            cached = self._semantic_cache.get(*cache_key)
+            if cached:
+                return await self._record_cached_turn(state, request, cached)
+        
         self._add_user_message(state, request)
         
         final_state = await self._process_through_graph(state)
-        return self._create_response(final_state)
+        response = self._create_response(final_state)
+        if cache_key and self._is_cacheable(response):
+            self._semantic_cache.put(*cache_key, response)
+        return response
+    
+    async def _record_cached_turn(self, state: AgentState, request: ConversationRequest, cached: ConversationResponse) -> ConversationResponse:
+        """Append a cache-served exchange to the conversation and checkpoint it as a completed run"""
+        self._add_user_message(state, request)
+        state["messages"].append(Message.model_construct(
+            role="assistant",
+            content=cached.response,
+            metadata=cached.metadata
+        ))
+        self._trim_history(state["messages"])
+        state = await self._update_memory(state)
+        config = {"configurable": {"thread_id": state["conversation_id"]}}
+        await self.graph.aupdate_state(config, state, as_node="update_memory")
+        return self._create_response(state)
+    
+    async def _semantic_cache_key(self, state: AgentState, request: ConversationRequest) -> Optional[Tuple[bytes, List[float]]]:
+        """Embed the user message together with its conversation context for the semantic cache"""
+        if not self.config.enable_semantic_cache or self.embeddings is None:
+            return None
+        try:
+            embedding = await self.embeddings.aembed_query(request.message)
+        except Exception:
+            return None
+        return SemanticCache.context_key(state["messages"]), embedding
+    
+    def _is_cacheable(self, response: ConversationResponse) -> bool:
+        """Only cache successful responses that did not depend on live tool output"""
+        if response.tools_used:
+            return False
+        return not (response.metadata and "error" in response.metadata)
     
     async def _get_or_create_state(self, request: ConversationRequest) -> AgentState:
         """Get existing state or create new one"""
         if request.conversation_id:
             return await self._retrieve_or_create_state(request.conversation_id)
         else:
-            conversation_id = str(uuid.uuid4())
+            conversation_id = uuid.uuid4().hex
             return self._create_initial_state(conversation_id)
     
     async def _retrieve_or_create_state(self, conversation_id: str) -> AgentState:
         """Try to retrieve existing state, create new if fails"""
         try:
             config = {"configurable": {"thread_id": conversation_id}}
-            return await self.graph.aget_state(config)
-        except:
-            return self._create_initial_state(conversation_id)
+            snapshot = await self.graph.aget_state(config)
+            if snapshot.values:
+                return snapshot.values
+        except Exception:
+            pass
+        return self._create_initial_state(conversation_id)
     
     def _add_user_message(self, state: AgentState, request: ConversationRequest):
         """Add user message to state"""
-        user_message = Message(
+        user_message = Message.model_construct(
             role="user",
             content=request.message,
             metadata=request.context
         )
         state["messages"].append(user_message)
+        self._trim_history(state["messages"])
+    
+    def _trim_history(self, messages: List[Message]):
+        """Drop the oldest messages in place, keeping the system prompt, once over the limit"""
+        excess = len(messages) - self.config.max_history_messages
+        if excess <= 0:
+            return
+        start = 1 if messages[0].role == "system" else 0
+        del messages[start:start + excess]
     
     async def _process_through_graph(self, state: AgentState) -> AgentState:
         """Process state through the graph"""
@@ -362,7 +514,7 @@ If no tools were used, provide a helpful response based on the user's message.""
         response_message = final_state["messages"][-1]
         tools_used = response_message.metadata.get("tools_used", []) if response_message.metadata else []
         
-        return ConversationResponse(
+        return ConversationResponse.model_construct(
             response=response_message.content,
             conversation_id=final_state["conversation_id"],
             tools_used=tools_used,
@@ -3,16 +3,78 @@ MCP Client for communicating with the FastMCP server
 """
 
 import asyncio
-import json
+import sys
+import time
 import aiohttp
-from typing import Any, Dict, List, Optional
-from pydantic import BaseModel
+import orjson
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict
+
+from shared.calculator import safe_eval
 
 from .models import ToolResult
 
 
+# Per-call timeout for batched tool executions, and a concurrency cap matching
+# the connector's limit_per_host so a large batch cannot starve the pool
+TOOL_CALL_TIMEOUT = 30.0
+MAX_CONCURRENT_TOOL_CALLS = 32
+# Deadline for a whole execute_tools batch, including time spent waiting on the semaphore
+TOOL_BATCH_TIMEOUT = 60.0
+
+# How long a fetched tool list is reused before asking the server again
+TOOLS_CACHE_TTL = 60.0
+
+
+# Static description of the tools exposed through the MCP server
+AVAILABLE_TOOLS = (
+    {
+        "name": "web_search",
+        "description": "Search the web for information",
+        "parameters": {"query": {"type": "string", "description": "Search query"}}
+    },
+    {
+        "name": "read_file",
+        "description": "Read contents of a file",
+        "parameters": {"file_path": {"type": "string", "description": "Path to file"}}
+    },
+    {
+        "name": "write_file",
+        "description": "Write content to a file",
+        "parameters": {
+            "file_path": {"type": "string", "description": "Path to file"},
+            "content": {"type": "string", "description": "Content to write"}
+        }
+    },
+    {
+        "name": "list_directory",
+        "description": "List contents of a directory",
+        "parameters": {"directory_path": {"type": "string", "description": "Path to directory"}}
+    },
+    {
+        "name": "calculate",
+        "description": "Safely evaluate mathematical expressions",
+        "parameters": {"expression": {"type": "string", "description": "Mathematical expression"}}
+    },
+    {
+        "name": "get_system_info",
+        "description": "Get current system information",
+        "parameters": {}
+    },
+    {
+        "name": "transcribe_audio",
+        "description": "Transcribe audio from a .wav file using OpenAI's Whisper API",
+        "parameters": {
+            "file_path": {"type": "string", "description": "Path to the .wav audio file"}
+        }
+    }
+)
+
+
 class MCPTool(BaseModel):
     """MCP Tool definition"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     name: str
     description: str
     parameters: Dict[str, Any]
@@ -21,29 +83,65 @@ class MCPTool(BaseModel):
 class MCPClient:
     """Client for communicating with the FastMCP server"""
     
-    def __init__(self, server_url: str = "http://localhost:8001"):
+    _JSON_HEADERS = {"Content-Type": "application/json"}
+    
+    def __init__(self, server_url: str = "http://localhost:8001", session: Optional[aiohttp.ClientSession] = None):
         self.server_url = server_url
-        self.session: Optional[aiohttp.ClientSession] = None
+        self._session = session
+        self._owns_session = session is None
+        self._tool_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+        self._tools_cache: Optional[List[MCPTool]] = None
+        self._tools_cache_deadline = 0.0
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        await self._get_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        await self.aclose()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it lazily on the running event loop"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    limit_per_host=32,
+                    keepalive_timeout=75,
+                    # Plain-HTTP MCP servers never need an SSL context
+                    ssl=self.server_url.startswith("https://")
+                ),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+            self._owns_session = True
+        return self._session
+    
+    async def aclose(self):
+        """Close the pooled session if this client created it"""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+    
+    def invalidate_tools_cache(self):
+        """Force the next get_tools call to fetch the tool list from the server"""
+        self._tools_cache = None
+        self._tools_cache_deadline = 0.0
     
     async def get_tools(self) -> List[MCPTool]:
         """Get available tools from the MCP server"""
+        if self._tools_cache and time.monotonic() < self._tools_cache_deadline:
+            return self._tools_cache
+        
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
+            session = await self._get_session()
             
             # FastMCP v2 uses /mcp endpoint to get tools
-            async with self.session.get(f"{self.server_url}/mcp") as response:
+            async with session.get(f"{self.server_url}/mcp") as response:
                 if response.status == 200:
                     tools_data = await response.json()
-                    return [MCPTool(**tool) for tool in tools_data]
+                    # Tool metadata comes from our own MCP server, so skip revalidation
+                    self._tools_cache = [MCPTool.model_construct(**tool) for tool in tools_data]
+                    self._tools_cache_deadline = time.monotonic() + TOOLS_CACHE_TTL
+                    return self._tools_cache
                 else:
                     print(f"Failed to get tools: {response.status}")
                     return []
@@ -54,16 +152,15 @@ class MCPClient:
     async def execute_tool(self, tool_name: str, **kwargs) -> ToolResult:
         """Execute a tool on the MCP server"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
+            session = await self._get_session()
             
             # FastMCP v2 uses direct POST to /mcp/{tool_name}
             url = f"{self.server_url}/mcp/{tool_name}"
             
-            async with self.session.post(
+            async with session.post(
                 url,
-                json=kwargs,
-                headers={"Content-Type": "application/json"}
+                data=orjson.dumps(kwargs),
+                headers=self._JSON_HEADERS
             ) as response:
                 if response.status == 200:
                     result_text = await response.text()
@@ -89,42 +186,85 @@ class MCPClient:
                 error=str(e)
             )
     
+    async def execute_tools(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[ToolResult]:
+        """Execute independent tool calls concurrently, returning results in call order"""
+        tasks: List[asyncio.Task] = []
+        try:
+            # Calls still running at the batch deadline are cancelled, releasing their connections
+            if sys.version_info >= (3, 11):
+                async with asyncio.timeout(TOOL_BATCH_TIMEOUT), asyncio.TaskGroup() as group:
+                    tasks = [
+                        group.create_task(self._execute_tool_guarded(tool_name, arguments))
+                        for tool_name, arguments in calls
+                    ]
+            else:
+                tasks = [
+                    asyncio.ensure_future(self._execute_tool_guarded(tool_name, arguments))
+                    for tool_name, arguments in calls
+                ]
+                await asyncio.wait_for(asyncio.gather(*tasks), TOOL_BATCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        
+        return [
+            task.result() if task.done() and not task.cancelled() else ToolResult(
+                tool_name=tool_name,
+                success=False,
+                result=None,
+                error=f"Tool batch timed out after {TOOL_BATCH_TIMEOUT:.0f}s"
+            )
+            for (tool_name, _), task in zip(calls, tasks)
+        ]
+    
+    async def _execute_tool_guarded(self, tool_name: str, arguments: Dict[str, Any]) -> ToolResult:
+        """Execute one tool of a batch so that its failure cannot affect the others"""
+        try:
+            async with self._tool_semaphore:
+                return await asyncio.wait_for(self.execute_tool(tool_name, **arguments), TOOL_CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            error = f"Tool call timed out after {TOOL_CALL_TIMEOUT:.0f}s"
+        except Exception as e:
+            error = str(e)
+        return ToolResult(tool_name=tool_name, success=False, result=None, error=error)
+    
     async def health_check(self) -> bool:
         """Check if the MCP server is healthy"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
+            session = await self._get_session()
             
             # FastMCP v2 uses /mcp endpoint for health check
-            async with self.session.get(f"{self.server_url}/mcp") as response:
+            async with session.get(f"{self.server_url}/mcp") as response:
                 return response.status == 200
         except Exception:
             return False
 
 
+_MOCK_TOOLS = (
+    MCPTool(
+        name="web_search",
+        description="Search the web for information",
+        parameters={"query": {"type": "string", "description": "Search query"}}
+    ),
+    MCPTool(
+        name="read_file",
+        description="Read contents of a file",
+        parameters={"file_path": {"type": "string", "description": "Path to file"}}
+    ),
+    MCPTool(
+        name="calculate",
+        description="Safely evaluate mathematical expressions",
+        parameters={"expression": {"type": "string", "description": "Mathematical expression"}}
+    )
+)
+
+
 # Mock MCP client for testing when server is not available
 class MockMCPClient(MCPClient):
     """Mock MCP client for testing"""
     
     async def get_tools(self) -> List[MCPTool]:
         """Return mock tools"""
-        return [
-            MCPTool(
-                name="web_search",
-                description="Search the web for information",
-                parameters={"query": {"type": "string", "description": "Search query"}}
-            ),
-            MCPTool(
-                name="read_file",
-                description="Read contents of a file",
-                parameters={"file_path": {"type": "string", "description": "Path to file"}}
-            ),
-            MCPTool(
-                name="calculate",
-                description="Safely evaluate mathematical expressions",
-                parameters={"expression": {"type": "string", "description": "Mathematical expression"}}
-            )
-        ]
+        return list(_MOCK_TOOLS)
     
     async def execute_tool(self, tool_name: str, **kwargs) -> ToolResult:
         """Return mock tool results"""
@@ -141,7 +281,7 @@ class MockMCPClient(MCPClient):
         elif tool_name == "calculate":
             try:
                 expression = kwargs.get("expression", "")
-                result = eval(expression)
+                result = safe_eval(expression)
                 return ToolResult(
                     tool_name=tool_name,
                     success=True,
@@ -3,21 +3,29 @@ Data models for the LangGraph agent system
 """
 
 from typing import Any, Dict, List, Optional, TypedDict
-from pydantic import BaseModel, Field
-from datetime import datetime
+import msgspec
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime, timezone
+
+
+def _utcnow() -> datetime:
+    """Timezone-aware current time in UTC"""
+    return datetime.now(timezone.utc)
 
 
 class Message(BaseModel):
     """A message in the conversation"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     role: str = Field(..., description="Role of the message sender (user, assistant, system)")
     content: str = Field(..., description="Content of the message")
-    timestamp: datetime = Field(default_factory=datetime.now)
+    timestamp: datetime = Field(default_factory=_utcnow)
     metadata: Optional[Dict[str, Any]] = Field(default=None, description="Additional metadata")
 
 
 class AgentState(TypedDict):
     """State for the LangGraph agent"""
-    messages: List[Message]
+    messages: List[Message]  # Trimmed in place to AgentConfig.max_history_messages
     current_task: Optional[str]
     context: Dict[str, Any]
     agent_memory: Dict[str, Any]
@@ -25,13 +33,32 @@ class AgentState(TypedDict):
     conversation_id: str
 
 
+class AnalysisPlan(msgspec.Struct):
+    """Intent analysis and response plan produced by the LLM in a single call.
+
+    Fields are loosely typed because the model does not always follow the requested
+    shape (nulls, lists for strings, bare tool arguments); the agent normalizes them
+    after decoding instead of rejecting the whole plan.
+    """
+    intent: Any = "conversation"
+    needs_tools: Any = False
+    response_type: Any = "conversational"
+    priority: Any = "medium"
+    plan: Any = "Provide a helpful response"
+    tools_to_use: Any = None
+    tool_arguments: Any = None
+    response_strategy: Any = "conversational"
+
+
 class ToolResult(BaseModel):
     """Result from a tool execution"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     tool_name: str
     success: bool
     result: Any
     error: Optional[str] = None
-    timestamp: datetime = Field(default_factory=datetime.now)
+    timestamp: datetime = Field(default_factory=_utcnow)
 
 
 class ConversationRequest(BaseModel):
@@ -56,4 +83,10 @@ class AgentConfig(BaseModel):
     max_tokens: int = Field(default=1000, description="Maximum tokens for response")
     system_prompt: str = Field(default="You are a helpful AI assistant.", description="System prompt")
     enable_tools: bool = Field(default=True, description="Whether to enable tool usage")
-    mcp_server_url: str = Field(default="http://localhost:8001", description="MCP server URL") 
\ No newline at end of file
+    mcp_server_url: str = Field(default="http://localhost:8001", description="MCP server URL")
+    max_history_messages: int = Field(default=50, description="Maximum messages kept in a conversation's state")
+    max_history_chars: int = Field(default=8000, description="Character budget for conversation history sent to the LLM")
+    enable_semantic_cache: bool = Field(default=False, description="Whether to reuse responses for semantically similar messages")
+    semantic_cache_embedding_model: str = Field(default="nomic-embed-text", description="Ollama embedding model used to match cached messages")
+    semantic_cache_threshold: float = Field(default=0.92, description="Minimum cosine similarity for a semantic cache hit")
+    semantic_cache_size: int = Field(default=256, description="Maximum number of cached responses") 
\ No newline at end of file
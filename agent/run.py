@@ -3,18 +3,25 @@
 Startup script for the Digital Clone Agent API Server
 """
 
+import asyncio
 import sys
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(env_path)
 
 # Add the parent directory to the path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from shared.env import ensure_loaded
+
+# Load environment variables from .env file
+ensure_loaded()
+
+# Prefer the libuv-backed event loop when uvloop is installed
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 from agent.api import AgentAPIServer
 from agent.models import AgentConfig
 
@@ -5,17 +5,16 @@ A conversational AI system with MCP server and LangGraph agent
 """
 
 import asyncio
+import functools
 import subprocess
 import sys
 import time
 import os
 from typing import List, Optional
-from pathlib import Path
-from dotenv import load_dotenv
+from shared.env import ensure_loaded
 
 # Load environment variables from .env file
-env_path = Path(__file__).parent / '.env'
-load_dotenv(env_path)
+ensure_loaded()
 
 
 def print_banner():
@@ -34,24 +33,24 @@ def print_banner():
     print(banner)
 
 
+@functools.lru_cache(maxsize=1)
 def check_ollama():
     """Check if Ollama is running and has the required model"""
+    import requests
+    
     try:
         # Check if Ollama is running
-        result = subprocess.run(
-            ["curl", "-s", "http://localhost:11434/api/tags"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode != 0:
-            print("❌ Ollama is not running. Please start Ollama first:")
-            print("   ollama serve")
-            return False
-        
+        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response.raise_for_status()
+    except requests.RequestException:
+        print("❌ Ollama is not running. Please start Ollama first:")
+        print("   ollama serve")
+        return False
+    
+    try:
         # Check if llama3:8b model is available
-        if "llama3:8b" not in result.stdout:
+        models = {model.get("name") for model in response.json().get("models", [])}
+        if "llama3:8b" not in models:
             print("⚠️  llama3:8b model not found. Please pull it:")
             print("   ollama pull llama3:8b")
             return False
@@ -65,23 +64,41 @@ def check_ollama():
         return False
 
 
+def _wait_ready(url, process, timeout=30, interval=0.1):
+    """Poll a server URL until it responds, the process exits, or the timeout passes"""
+    import requests
+    
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(url, timeout=0.5).status_code < 500:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(interval)
+    return False
+
+
 def start_ray_serve_tools():
     """Start the Ray Serve tools server"""
     print("\n🚀 Starting Ray Serve Tools Server...")
     try:
         process = subprocess.Popen([
             sys.executable, "tools_server/run.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        
-        # Wait a moment for server to start
-        time.sleep(5)
+        ])
         
-        if process.poll() is None:
+        # Wait until the server answers, or exits early
+        if _wait_ready("http://localhost:8003/tools/health", process, timeout=60):
             print("✅ Ray Serve Tools Server started successfully on port 8003")
             return process
+        elif process.poll() is None:
+            process.terminate()
+            print("❌ Ray Serve tools server did not become ready within 60s")
+            return None
         else:
-            stdout, stderr = process.communicate()
-            print(f"❌ Failed to start Ray Serve tools server: {stderr}")
+            print(f"❌ Failed to start Ray Serve tools server (exit code {process.returncode})")
             return None
             
     except Exception as e:
@@ -95,17 +112,18 @@ def start_mcp_server():
     try:
         process = subprocess.Popen([
             sys.executable, "mcp_server/run.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        
-        # Wait a moment for server to start
-        time.sleep(2)
+        ])
         
-        if process.poll() is None:
+        # Wait until the server answers, or exits early
+        if _wait_ready("http://127.0.0.1:8001/mcp", process, timeout=30):
             print("✅ MCP Server started successfully on port 8001")
             return process
+        elif process.poll() is None:
+            process.terminate()
+            print("❌ MCP server did not become ready within 30s")
+            return None
         else:
-            stdout, stderr = process.communicate()
-            print(f"❌ Failed to start MCP server: {stderr}")
+            print(f"❌ Failed to start MCP server (exit code {process.returncode})")
             return None
             
     except Exception as e:
@@ -119,17 +137,18 @@ def start_agent_server():
     try:
         process = subprocess.Popen([
             sys.executable, "agent/run.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        ])
         
-        # Wait a moment for server to start
-        time.sleep(3)
-        
-        if process.poll() is None:
+        # Wait until the server answers, or exits early
+        if _wait_ready("http://localhost:8002/health", process, timeout=30):
             print("✅ Agent API Server started successfully on port 8002")
             return process
+        elif process.poll() is None:
+            process.terminate()
+            print("❌ Agent server did not become ready within 30s")
+            return None
         else:
-            stdout, stderr = process.communicate()
-            print(f"❌ Failed to start agent server: {stderr}")
+            print(f"❌ Failed to start agent server (exit code {process.returncode})")
             return None
             
     except Exception as e:
@@ -364,17 +383,29 @@ def run_single_server(process, server_name):
 
 def monitor_processes(ray_process, mcp_process, agent_process):
     """Monitor all processes for unexpected termination"""
+    servers = {
+        ray_process.pid: (ray_process, "Ray Serve Tools Server"),
+        mcp_process.pid: (mcp_process, "MCP Server"),
+        agent_process.pid: (agent_process, "Agent Server")
+    }
+    
+    if os.name != "posix":
+        while True:
+            time.sleep(1)
+            for process, name in servers.values():
+                if process.poll() is not None:
+                    print(f"❌ {name} stopped unexpectedly")
+                    return
+    
+    # Block in the kernel until any child exits instead of waking up to poll
     while True:
-        time.sleep(1)
-        if ray_process.poll() is not None:
-            print("❌ Ray Serve Tools Server stopped unexpectedly")
-            break
-        if mcp_process.poll() is not None:
-            print("❌ MCP Server stopped unexpectedly")
-            break
-        if agent_process.poll() is not None:
-            print("❌ Agent Server stopped unexpectedly")
-            break
+        pid, status = os.waitpid(-1, 0)
+        if pid in servers:
+            process, name = servers[pid]
+            # Record the reaped status so Popen does not signal a recycled pid later
+            process.returncode = os.waitstatus_to_exitcode(status)
+            print(f"❌ {name} stopped unexpectedly")
+            return
 
 
 def stop_servers(ray_process, mcp_process, agent_process):
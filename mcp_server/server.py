@@ -3,23 +3,53 @@ FastMCP Server for Digital Clone App
 Thin proxy layer that forwards tool calls to Ray Serve endpoints
 """
 
+import asyncio
+import inspect
+import os
 import aiohttp
-import json
-from pathlib import Path
-from typing import Dict, Any
-from dotenv import load_dotenv
+import orjson
+from typing import Dict, Any, Optional
+from shared.env import ensure_loaded
 
 from fastmcp import FastMCP
 
 # Load environment variables from .env file
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(env_path)
+ensure_loaded()
 
 # Create the MCP server instance
 mcp = FastMCP(name="digital-clone-mcp")
 
 # Ray Serve tools server configuration
-RAY_SERVE_URL = "http://localhost:8003"
+RAY_SERVE_URL = os.getenv("RAY_SERVE_URL", "http://localhost:8003")
+# Optional Unix domain socket fronting Ray Serve; skips the loopback TCP stack when set
+RAY_SERVE_UDS = os.getenv("RAY_SERVE_UDS")
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Shared HTTP session for calls to Ray Serve, bound to the event loop it was created on
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _make_connector() -> aiohttp.BaseConnector:
+    """Build the connector for the Ray Serve hop, over a Unix socket when configured"""
+    if RAY_SERVE_UDS:
+        return aiohttp.UnixConnector(path=RAY_SERVE_UDS, limit=100, keepalive_timeout=75)
+    # Ray Serve is reached over plain HTTP on localhost, so skip SSL context setup
+    return aiohttp.TCPConnector(limit=100, limit_per_host=32, keepalive_timeout=75, ssl=False)
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Return the shared session for the running event loop, creating it on first use"""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    # No await between the check and the assignment, so concurrent callers cannot race here
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            connector=_make_connector(),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+        _session_loop = loop
+    return _session
 
 
 async def _call_ray_serve_tool(endpoint: str, data: Dict[str, Any]) -> str:
@@ -34,167 +64,98 @@ async def _call_ray_serve_tool(endpoint: str, data: Dict[str, Any]) -> str:
         str: Tool result or error message
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{RAY_SERVE_URL}/tools/{endpoint}"
-            async with session.post(url, json=data, timeout=30) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    if result.get("success"):
-                        return result.get("result", "")
-                    else:
-                        return f"Tool error: {result.get('error', 'Unknown error')}"
+        session = _get_session()
+        url = f"{RAY_SERVE_URL}/tools/{endpoint}"
+        async with session.post(url, data=orjson.dumps(data), headers=_JSON_HEADERS) as response:
+            if response.status == 200:
+                result = orjson.loads(await response.read())
+                if result.get("success"):
+                    return result.get("result", "")
                 else:
-                    return f"HTTP error {response.status}: {await response.text()}"
+                    return f"Tool error: {result.get('error', 'Unknown error')}"
+            else:
+                return f"HTTP error {response.status}: {await response.text()}"
     except Exception as e:
         return f"Error calling Ray Serve tool: {str(e)}"
 
 
-@mcp.tool
-def web_search(query: str) -> str:
-    """
-    Search the web for information using DuckDuckGo.
-    
-    Args:
-        query: The search query to look up
-        
-    Returns:
-        str: Search results or error message
-    """
-    import asyncio
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_call_ray_serve_tool("web_search", {"query": query}))
-    finally:
-        loop.close()
+# Name, parameters and description of every Ray Serve tool exposed over MCP
+_TOOLS = (
+    ("web_search", {"query": str}, """Search the web for information using DuckDuckGo.
 
+Args:
+    query: The search query to look up
 
-@mcp.tool
-def read_file(file_path: str) -> str:
-    """
-    Read contents of a file.
-    
-    Args:
-        file_path: Path to the file to read
-        
-    Returns:
-        str: File contents or error message
-    """
-    import asyncio
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_call_ray_serve_tool("read_file", {"file_path": file_path}))
-    finally:
-        loop.close()
+Returns:
+    str: Search results or error message"""),
+    ("read_file", {"file_path": str}, """Read contents of a file.
 
+Args:
+    file_path: Path to the file to read
 
-@mcp.tool
-def write_file(file_path: str, content: str) -> str:
-    """
-    Write content to a file.
-    
-    Args:
-        file_path: Path to the file to write
-        content: Content to write to the file
-        
-    Returns:
-        str: Success message or error
-    """
-    import asyncio
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_call_ray_serve_tool("write_file", {
-            "file_path": file_path,
-            "content": content
-        }))
-    finally:
-        loop.close()
+Returns:
+    str: File contents or error message"""),
+    ("write_file", {"file_path": str, "content": str}, """Write content to a file.
 
+Args:
+    file_path: Path to the file to write
+    content: Content to write to the file
 
-@mcp.tool
-def list_directory(directory_path: str) -> str:
-    """
-    List contents of a directory.
-    
-    Args:
-        directory_path: Path to the directory to list
-        
-    Returns:
-        str: Directory listing or error message
-    """
-    import asyncio
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_call_ray_serve_tool("list_directory", {"directory_path": directory_path}))
-    finally:
-        loop.close()
+Returns:
+    str: Success message or error"""),
+    ("list_directory", {"directory_path": str}, """List contents of a directory.
 
+Args:
+    directory_path: Path to the directory to list
 
-@mcp.tool
-def calculate(expression: str) -> str:
-    """
-    Safely evaluate mathematical expressions.
-    
-    Args:
-        expression: Mathematical expression to evaluate
-        
-    Returns:
-        str: Result or error message
-    """
-    import asyncio
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_call_ray_serve_tool("calculate", {"expression": expression}))
-    finally:
-        loop.close()
+Returns:
+    str: Directory listing or error message"""),
+    ("calculate", {"expression": str}, """Safely evaluate mathematical expressions.
 
+Args:
+    expression: Mathematical expression to evaluate
 
-@mcp.tool
-def get_system_info() -> str:
-    """
-    Get current system information.
-    
-    Returns:
-        str: System information
-    """
-    import asyncio
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_call_ray_serve_tool("get_system_info", {}))
-    finally:
-        loop.close()
+Returns:
+    str: Result or error message"""),
+    ("get_system_info", {}, """Get current system information.
+
+Returns:
+    str: System information"""),
+    ("transcribe_audio", {"file_path": str}, """Transcribe audio from a .wav file using OpenAI's Whisper API.
+
+Args:
+    file_path: Path to the .wav audio file to transcribe
+
+Returns:
+    str: Transcribed text or error message""")
+)
 
 
-@mcp.tool
-def transcribe_audio(file_path: str) -> str:
+def _make_tool(name: str, parameters: Dict[str, type], doc: str):
     """
-    Transcribe audio from a .wav file using OpenAI's Whisper API.
+    Build an async MCP tool that forwards its arguments to the Ray Serve endpoint
     
-    Args:
-        file_path: Path to the .wav audio file to transcribe
-        
-    Returns:
-        str: Transcribed text or error message
+    The explicit signature and annotations let FastMCP derive the tool's input
+    schema just as it would for a hand-written function.
     """
-    import asyncio
+    async def tool(**kwargs) -> str:
+        return await _call_ray_serve_tool(name, kwargs)
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_call_ray_serve_tool("transcribe_audio", {"file_path": file_path}))
-    finally:
-        loop.close()
+    tool.__name__ = tool.__qualname__ = name
+    tool.__doc__ = doc
+    tool.__annotations__ = {**parameters, "return": str}
+    tool.__signature__ = inspect.Signature(
+        [
+            inspect.Parameter(param, inspect.Parameter.KEYWORD_ONLY, annotation=annotation)
+            for param, annotation in parameters.items()
+        ],
+        return_annotation=str
+    )
+    return tool
+
+
+for _name, _parameters, _doc in _TOOLS:
+    mcp.tool(_make_tool(_name, _parameters, _doc))
 
 
 if __name__ == "__main__":
@@ -202,6 +163,6 @@ if __name__ == "__main__":
     print("🚀 Starting FastMCP Server for Digital Clone")
     print("📍 Port: 8001")
     print("🔧 Available tools: web_search, read_file, write_file, list_directory, calculate, get_system_info, transcribe_audio")
-    print("🔗 Ray Serve Tools Server: http://localhost:8003")
+    print(f"🔗 Ray Serve Tools Server: {RAY_SERVE_UDS or RAY_SERVE_URL}")
     
     mcp.run(transport="http", host="127.0.0.1", port=8001) 
\ No newline at end of file
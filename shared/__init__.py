@@ -0,0 +1 @@
+# Shared Utilities Package 
\ No newline at end of file
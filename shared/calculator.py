@@ -0,0 +1,72 @@
+"""
+Arithmetic expression evaluator shared by the agent and the tools server
+"""
+
+import ast
+import functools
+import operator
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow
+}
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg
+}
+_MAX_EXPONENT = 1000
+# Largest integer, in bits, allowed as an operand or result (about 1,200 decimal digits)
+_MAX_INT_BITS = 4096
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_expression(expression: str) -> ast.expr:
+    """Parse an arithmetic expression, caching the tree for repeated inputs"""
+    return ast.parse(expression, mode="eval").body
+
+
+def _check_size(value):
+    """Reject integers too large to keep computing with cheaply"""
+    if isinstance(value, int) and value.bit_length() > _MAX_INT_BITS:
+        raise ValueError(f"Result too large: exceeds {_MAX_INT_BITS} bits")
+    return value
+
+
+def _check_power(base, exponent):
+    """Bound a power before computing it, since nested powers grow the result exponentially"""
+    if abs(exponent) > _MAX_EXPONENT:
+        raise ValueError(f"Exponent too large: {exponent}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        # bit_length * exponent overestimates the result's size, so allow headroom here and
+        # leave the exact limit to _check_size
+        if base.bit_length() * exponent > _MAX_INT_BITS * 2:
+            raise ValueError(f"Result too large: exceeds {_MAX_INT_BITS} bits")
+
+
+def _evaluate(node: ast.expr):
+    """Evaluate a parsed arithmetic expression limited to numbers and basic operators"""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return _check_size(node.value)
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow):
+            _check_power(left, right)
+        return _check_size(_BINARY_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, (ast.BinOp, ast.UnaryOp)):
+        raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+    raise ValueError(f"Unsupported expression element: {type(node).__name__}")
+
+
+def safe_eval(expression: str):
+    """Safely evaluate an arithmetic expression without eval()"""
+    try:
+        return _evaluate(_parse_expression(expression.strip()))
+    except OverflowError:
+        raise ValueError("Result too large to represent")
@@ -0,0 +1,20 @@
+"""
+Environment loading shared by every Digital Clone entry point
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+ENV_PATH = Path(__file__).parent.parent / '.env'
+
+# Inherited by child processes so servers launched from main.py skip re-parsing .env
+_LOADED_FLAG = "DIGITAL_CLONE_ENV_LOADED"
+
+
+def ensure_loaded() -> None:
+    """Load the project .env file once per process tree"""
+    if os.environ.get(_LOADED_FLAG):
+        return
+    load_dotenv(ENV_PATH)
+    os.environ[_LOADED_FLAG] = "1"
@@ -5,16 +5,15 @@ Startup script for the Ray Serve Tools Server
 
 import sys
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-
-# Load environment variables
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(env_path)
 
 # Add the parent directory to the path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from shared.env import ensure_loaded
+
+# Load environment variables
+ensure_loaded()
+
 from ray import serve
 from tools_server.tools import tools_deployment
 
@@ -3,30 +3,44 @@ Ray Serve Tools Implementation
 All tool functions converted to Ray Serve endpoints
 """
 
+import codecs
+import io
+import aiofiles
 import aiohttp
+import httpx
+import msgspec
+import orjson
 import platform
+import re
+import stat
 import sys
 import os
-import base64
 import asyncio
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, List, Optional, Type, TypeVar
 
+from cachetools import TTLCache
 from ray import serve
-from fastapi import FastAPI, HTTPException
+from ray.serve.handle import DeploymentHandle
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv
+from shared.calculator import safe_eval
+from shared.env import ensure_loaded
 
 # Load environment variables
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(env_path)
+ensure_loaded()
 
 # Create FastAPI app for Ray Serve
-app = FastAPI(title="Digital Clone Tools Server", version="0.1.0")
+app = FastAPI(
+    title="Digital Clone Tools Server",
+    version="0.1.0",
+    default_response_class=ORJSONResponse
+)
 
 
-class ToolRequest(BaseModel):
+class ToolRequest(msgspec.Struct):
     """Base model for tool requests"""
     pass
 
@@ -62,6 +76,20 @@ class TranscribeRequest(ToolRequest):
     file_path: str
 
 
+_RequestT = TypeVar("_RequestT", bound=ToolRequest)
+
+
+def _json_body(model: Type[_RequestT]):
+    """FastAPI dependency that decodes the JSON body straight into a request struct"""
+    async def decode(request: Request) -> _RequestT:
+        try:
+            return msgspec.json.decode(await request.body(), type=model)
+        except msgspec.DecodeError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    return Depends(decode)
+
+
 class ToolResponse(BaseModel):
     """Response model for all tools"""
     result: str
@@ -69,76 +97,96 @@ class ToolResponse(BaseModel):
     error: str = None
 
 
-@serve.deployment(num_replicas=2, )
-@serve.ingress(app)
-class ToolsServer:
-    """Ray Serve deployment for all tools"""
-    
-    def __init__(self):
-        """Initialize the tools server"""
-        pass
-    
-    @app.post("/web_search", response_model=ToolResponse)
-    async def web_search(self, request: WebSearchRequest) -> ToolResponse:
-        """Search the web for information using DuckDuckGo"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                url = "https://api.duckduckgo.com/"
-                params = {
-                    "q": request.query,
-                    "format": "json",
-                    "no_html": "1",
-                    "skip_disambig": "1"
-                }
-                
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        results = []
-                        if data.get("Abstract"):
-                            results.append(f"Abstract: {data.get('Abstract', '')}")
-                        
-                        for topic in data.get("RelatedTopics", [])[:3]:
-                            if isinstance(topic, dict) and topic.get("Text"):
-                                results.append(f"Related: {topic.get('Text', '')}")
-                        
-                        result = "\n\n".join(results) if results else "No results found."
-                        return ToolResponse(result=result, success=True)
-                    else:
-                        return ToolResponse(
-                            result="",
-                            success=False,
-                            error=f"Search failed with status {response.status}"
-                        )
-                        
-        except Exception as e:
-            return ToolResponse(
-                result="",
-                success=False,
-                error=f"Search error: {str(e)}"
-            )
+# Largest file read_file will return, and the chunk size it reads with
+MAX_READ_FILE_SIZE = int(os.getenv("TOOLS_MAX_READ_FILE_SIZE", str(10 * 1024 * 1024)))
+_READ_CHUNK_SIZE = 64 * 1024
+# write_file content above this size is written in chunks of this size
+_WRITE_CHUNK_SIZE = 1024 * 1024
+
+# Outbound endpoints and the request fields that never change between calls
+_DDG_URL = "https://api.duckduckgo.com/"
+_DDG_BASE_PARAMS = {"format": "json", "no_html": "1", "skip_disambig": "1"}
+_WHISPER_URL = "https://api.openai.com/v1/audio/transcriptions"
+_WHISPER_FORM_FIELDS = {"model": "whisper-1", "response_format": "text"}
+
+# Per-replica cache of web_search results
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 300.0
+
+# Characters permitted in calculate expressions
+_CALC_ALLOWED_RE = re.compile(r'[0-9+\-*/(). ]*')
+
+# System details that only change on restart, formatted once per process
+_STATIC_SYSINFO = f"platform: {platform.platform()}\npython_version: {sys.version}"
+
+
+def _stat_or_none(path: Path) -> Optional[os.stat_result]:
+    """Stat a path once, returning None when it does not exist; blocking, so run it in a worker thread"""
+    try:
+        return os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _list_directory_sync(path: Path, header: str) -> str:
+    """Format the listing with one line per entry; blocking, so run it in a worker thread"""
+    buf = io.StringIO()
+    buf.write(header)
+    separator = ""
+    # scandir reports entry types from the directory read itself, so only files need a stat
+    with os.scandir(path) as entries:
+        for entry in entries:
+            item_type = "DIR" if entry.is_dir() else "FILE"
+            size = entry.stat().st_size if entry.is_file() else "-"
+            buf.write(f"{separator}{item_type:4} {size:>8} {entry.name}")
+            separator = "\n"
+    return buf.getvalue()
+
+
+@serve.deployment(
+    num_replicas=2,
+    # File and CPU work is kept off the I/O replicas and given a smaller concurrency budget
+    max_ongoing_requests=16,
+    ray_actor_options={"num_cpus": 0.5}
+)
+class LocalToolsServer:
+    """Ray Serve deployment for tools that only touch the local machine"""
     
-    @app.post("/read_file", response_model=ToolResponse)
     async def read_file(self, request: FileRequest) -> ToolResponse:
         """Read contents of a file"""
         try:
             path = Path(request.file_path)
-            if not path.exists():
+            st = await asyncio.to_thread(_stat_or_none, path)
+            if st is None:
                 return ToolResponse(
                     result="",
                     success=False,
                     error=f"File not found: {request.file_path}"
                 )
             
-            if not path.is_file():
+            if not stat.S_ISREG(st.st_mode):
                 return ToolResponse(
                     result="",
                     success=False,
                     error=f"Path is not a file: {request.file_path}"
                 )
             
-            content = path.read_text(encoding='utf-8')
+            file_size = st.st_size
+            if file_size > MAX_READ_FILE_SIZE:
+                return ToolResponse(
+                    result="",
+                    success=False,
+                    error=f"File too large ({file_size / 1024 / 1024:.1f}MB). Maximum size is {MAX_READ_FILE_SIZE / 1024 / 1024:.0f}MB."
+                )
+            
+            # Decode chunk by chunk, translating newlines like text mode would
+            decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+            parts = []
+            async with aiofiles.open(path, 'rb') as f:
+                while chunk := await f.read(_READ_CHUNK_SIZE):
+                    parts.append(decoder.decode(chunk))
+            parts.append(decoder.decode(b'', final=True))
+            content = ''.join(parts)
             result = f"File contents ({len(content)} characters):\n\n{content}"
             return ToolResponse(result=result, success=True)
             
@@ -149,13 +197,20 @@ class ToolsServer:
                 error=f"Error reading file: {str(e)}"
             )
     
-    @app.post("/write_file", response_model=ToolResponse)
     async def write_file(self, request: WriteFileRequest) -> ToolResponse:
         """Write content to a file"""
         try:
             path = Path(request.file_path)
-            path.parent.mkdir(parents=True, exist_ok=True)
-            path.write_text(request.content, encoding='utf-8')
+            await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+            if len(request.content) > _WRITE_CHUNK_SIZE:
+                # Write large content in slices so the loop gets control back between chunks
+                data = memoryview(request.content.encode('utf-8'))
+                async with aiofiles.open(path, 'wb') as f:
+                    for offset in range(0, len(data), _WRITE_CHUNK_SIZE):
+                        await f.write(data[offset:offset + _WRITE_CHUNK_SIZE])
+            else:
+                async with aiofiles.open(path, 'w', encoding='utf-8') as f:
+                    await f.write(request.content)
             
             result = f"Successfully wrote {len(request.content)} characters to {request.file_path}"
             return ToolResponse(result=result, success=True)
@@ -167,32 +222,28 @@ class ToolsServer:
                 error=f"Error writing file: {str(e)}"
             )
     
-    @app.post("/list_directory", response_model=ToolResponse)
     async def list_directory(self, request: DirectoryRequest) -> ToolResponse:
         """List contents of a directory"""
         try:
             path = Path(request.directory_path)
-            if not path.exists():
+            st = await asyncio.to_thread(_stat_or_none, path)
+            if st is None:
                 return ToolResponse(
                     result="",
                     success=False,
                     error=f"Directory not found: {request.directory_path}"
                 )
             
-            if not path.is_dir():
+            if not stat.S_ISDIR(st.st_mode):
                 return ToolResponse(
                     result="",
                     success=False,
                     error=f"Path is not a directory: {request.directory_path}"
                 )
             
-            items = []
-            for item in path.iterdir():
-                item_type = "DIR" if item.is_dir() else "FILE"
-                size = item.stat().st_size if item.is_file() else "-"
-                items.append(f"{item_type:4} {size:>8} {item.name}")
-            
-            result = f"Directory listing for {request.directory_path}:\n\n" + "\n".join(items)
+            result = await asyncio.to_thread(
+                _list_directory_sync, path, f"Directory listing for {request.directory_path}:\n\n"
+            )
             return ToolResponse(result=result, success=True)
             
         except Exception as e:
@@ -202,20 +253,19 @@ class ToolsServer:
                 error=f"Error listing directory: {str(e)}"
             )
     
-    @app.post("/calculate", response_model=ToolResponse)
     async def calculate(self, request: CalculateRequest) -> ToolResponse:
         """Safely evaluate mathematical expressions"""
         try:
             # Only allow safe mathematical operations
-            allowed_chars = set('0123456789+-*/(). ')
-            if not all(c in allowed_chars for c in request.expression):
+            if not _CALC_ALLOWED_RE.fullmatch(request.expression):
                 return ToolResponse(
                     result="",
                     success=False,
                     error="Expression contains unsafe characters"
                 )
             
-            result = eval(request.expression)
+            # Evaluation is CPU-bound, so keep it off the replica's event loop
+            result = await asyncio.to_thread(safe_eval, request.expression)
             return ToolResponse(result=f"Result: {result}", success=True)
             
         except Exception as e:
@@ -225,18 +275,14 @@ class ToolsServer:
                 error=f"Calculation error: {str(e)}"
             )
     
-    @app.post("/get_system_info", response_model=ToolResponse)
     async def get_system_info(self) -> ToolResponse:
         """Get current system information"""
         try:
-            info = {
-                "platform": platform.platform(),
-                "python_version": sys.version,
-                "current_time": datetime.now().isoformat(),
-                "working_directory": str(Path.cwd())
-            }
-            
-            result = "\n".join([f"{k}: {v}" for k, v in info.items()])
+            result = (
+                f"{_STATIC_SYSINFO}\n"
+                f"current_time: {datetime.now().isoformat()}\n"
+                f"working_directory: {os.getcwd()}"
+            )
             return ToolResponse(result=result, success=True)
             
         except Exception as e:
@@ -245,21 +291,162 @@ class ToolsServer:
                 success=False,
                 error=f"Error getting system info: {str(e)}"
             )
+
+
+@serve.deployment(
+    num_replicas="auto",
+    # Handlers are I/O-bound, so each replica can keep many requests in flight
+    max_ongoing_requests=64,
+    autoscaling_config={"target_ongoing_requests": 8, "min_replicas": 2, "max_replicas": 32}
+)
+@serve.ingress(app)
+class ToolsServer:
+    """Ray Serve ingress for all tools; serves external I/O tools and forwards local ones"""
+    
+    def __init__(self, local_tools: DeploymentHandle):
+        """Initialize the tools server"""
+        self._local_tools = local_tools
+        # Outbound HTTP session shared by every request on this replica, created lazily
+        # on the replica's event loop so DuckDuckGo/OpenAI connections are reused
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Formatted DuckDuckGo results for repeated queries; failures are never cached
+        self._search_cache: TTLCache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        # Whisper uploads go over HTTP/2 so concurrent transcriptions share one TLS connection
+        self._openai_client: Optional[httpx.AsyncClient] = None
+        
+        # The key is read once per replica; only transcribe_audio needs it, so a missing
+        # key disables that tool instead of failing the whole deployment
+        api_key = os.getenv("OPENAI_API_KEY")
+        self._openai_headers: Optional[Dict[str, str]] = {"Authorization": f"Bearer {api_key}"} if api_key else None
+        if self._openai_headers is None:
+            print("⚠️  OPENAI_API_KEY not set; transcribe_audio will be unavailable")
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled outbound session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    limit_per_host=32,
+                    keepalive_timeout=30,
+                    # Resolve through aiodns instead of getaddrinfo in a thread, caching for 10 minutes
+                    resolver=aiohttp.AsyncResolver(),
+                    use_dns_cache=True,
+                    ttl_dns_cache=600
+                ),
+                # Bound each search so a slow upstream cannot pin handler slots indefinitely
+                timeout=aiohttp.ClientTimeout(total=10, connect=3, sock_read=8),
+                # Search responses can exceed the 64KB default read buffer
+                read_bufsize=4 * 1024 * 1024
+            )
+        return self._session
+    
+    def _get_openai_client(self) -> httpx.AsyncClient:
+        """Return the HTTP/2 client for OpenAI uploads, creating it on first use"""
+        if self._openai_client is None or self._openai_client.is_closed:
+            self._openai_client = httpx.AsyncClient(
+                http2=True,
+                # Uploads of up to 25MB plus transcription need a longer read window than search
+                timeout=httpx.Timeout(120.0, connect=5.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=30)
+            )
+        return self._openai_client
+    
+    async def __del__(self):
+        """Close the pooled clients when Ray Serve tears the replica down"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._openai_client is not None and not self._openai_client.is_closed:
+            await self._openai_client.aclose()
+    
+    @app.post("/web_search", response_model=ToolResponse)
+    async def web_search(self, request: WebSearchRequest = _json_body(WebSearchRequest)) -> ToolResponse:
+        """Search the web for information using DuckDuckGo"""
+        cached = self._search_cache.get(request.query)
+        if cached is not None:
+            return ToolResponse(result=cached, success=True)
+        return await self._search_batch(request.query)
+    
+    @serve.batch(max_batch_size=8, batch_wait_timeout_s=0.01)
+    async def _search_batch(self, queries: List[str]) -> List[ToolResponse]:
+        """Run searches that arrive within the batch window concurrently on the shared session"""
+        return await asyncio.gather(*(self._search(query) for query in queries))
+    
+    async def _search(self, query: str) -> ToolResponse:
+        """Query DuckDuckGo and format the abstract plus the top related topics"""
+        try:
+            session = self._get_session()
+            params = {**_DDG_BASE_PARAMS, "q": query}
+            
+            async with session.get(_DDG_URL, params=params) as response:
+                if response.status == 200:
+                    data = orjson.loads(await response.read())
+                    
+                    results = []
+                    if data.get("Abstract"):
+                        results.append(f"Abstract: {data.get('Abstract', '')}")
+                    
+                    for topic in data.get("RelatedTopics", [])[:3]:
+                        if isinstance(topic, dict) and topic.get("Text"):
+                            results.append(f"Related: {topic.get('Text', '')}")
+                    
+                    result = "\n\n".join(results) if results else "No results found."
+                    self._search_cache[query] = result
+                    return ToolResponse(result=result, success=True)
+                else:
+                    return ToolResponse(
+                        result="",
+                        success=False,
+                        error=f"Search failed with status {response.status}"
+                    )
+                    
+        except Exception as e:
+            return ToolResponse(
+                result="",
+                success=False,
+                error=f"Search error: {str(e)}"
+            )
+    
+    @app.post("/read_file", response_model=ToolResponse)
+    async def read_file(self, request: FileRequest = _json_body(FileRequest)) -> ToolResponse:
+        """Read contents of a file"""
+        return await self._local_tools.read_file.remote(request)
+    
+    @app.post("/write_file", response_model=ToolResponse)
+    async def write_file(self, request: WriteFileRequest = _json_body(WriteFileRequest)) -> ToolResponse:
+        """Write content to a file"""
+        return await self._local_tools.write_file.remote(request)
+    
+    @app.post("/list_directory", response_model=ToolResponse)
+    async def list_directory(self, request: DirectoryRequest = _json_body(DirectoryRequest)) -> ToolResponse:
+        """List contents of a directory"""
+        return await self._local_tools.list_directory.remote(request)
+    
+    @app.post("/calculate", response_model=ToolResponse)
+    async def calculate(self, request: CalculateRequest = _json_body(CalculateRequest)) -> ToolResponse:
+        """Safely evaluate mathematical expressions"""
+        return await self._local_tools.calculate.remote(request)
+    
+    @app.post("/get_system_info", response_model=ToolResponse)
+    async def get_system_info(self) -> ToolResponse:
+        """Get current system information"""
+        return await self._local_tools.get_system_info.remote()
     
     @app.post("/transcribe_audio", response_model=ToolResponse)
-    async def transcribe_audio(self, request: TranscribeRequest) -> ToolResponse:
+    async def transcribe_audio(self, request: TranscribeRequest = _json_body(TranscribeRequest)) -> ToolResponse:
         """Transcribe audio from a .wav file using OpenAI's Whisper API"""
         try:
             # Check if file exists
             path = Path(request.file_path)
-            if not path.exists():
+            st = await asyncio.to_thread(_stat_or_none, path)
+            if st is None:
                 return ToolResponse(
                     result="",
                     success=False,
                     error=f"Audio file not found: {request.file_path}"
                 )
             
-            if not path.is_file():
+            if not stat.S_ISREG(st.st_mode):
                 return ToolResponse(
                     result="",
                     success=False,
@@ -274,8 +461,18 @@ class ToolsServer:
                     error=f"File must be a .wav file, got: {path.suffix}"
                 )
             
+            # Reject files that are not RIFF/WAVE before uploading anything
+            async with aiofiles.open(path, 'rb') as f:
+                header = await f.read(12)
+            if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return ToolResponse(
+                    result="",
+                    success=False,
+                    error=f"File is not a valid WAV file: {request.file_path}"
+                )
+            
             # Check file size (Whisper has limits)
-            file_size = path.stat().st_size
+            file_size = st.st_size
             max_size = 25 * 1024 * 1024  # 25MB limit
             if file_size > max_size:
                 return ToolResponse(
@@ -284,51 +481,35 @@ class ToolsServer:
                     error=f"File too large ({file_size / 1024 / 1024:.1f}MB). Maximum size is 25MB."
                 )
             
-            # Get OpenAI API key
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
+            if self._openai_headers is None:
                 return ToolResponse(
                     result="",
                     success=False,
                     error="OPENAI_API_KEY environment variable not set"
                 )
             
-            # Read and encode the audio file
-            with open(path, "rb") as audio_file:
-                audio_data = audio_file.read()
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+            # httpx reads multipart file objects synchronously, so the recording (at most
+            # 25MB) is read off the event loop first and uploaded from memory
+            async with aiofiles.open(path, 'rb') as f:
+                audio = await f.read()
             
-            # Prepare the request to OpenAI Whisper API
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
+            # The transcription endpoint takes multipart/form-data; send it over the HTTP/2 client
+            response = await self._get_openai_client().post(
+                _WHISPER_URL,
+                headers=self._openai_headers,
+                data=_WHISPER_FORM_FIELDS,
+                files={"file": (path.name, audio, "audio/wav")}
+            )
             
-            payload = {
-                "model": "whisper-1",
-                "file": f"data:audio/wav;base64,{audio_base64}",
-                "response_format": "text"
-            }
+            if response.status_code == 200:
+                return ToolResponse(result=response.text, success=True)
+            else:
+                return ToolResponse(
+                    result="",
+                    success=False,
+                    error=f"Error from OpenAI API (status {response.status_code}): {response.text}"
+                )
             
-            # Make the API request
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.openai.com/v1/audio/transcriptions",
-                    headers=headers,
-                    json=payload,
-                    timeout=60
-                ) as response:
-                    if response.status == 200:
-                        result = await response.text()
-                        return ToolResponse(result=result, success=True)
-                    else:
-                        error_text = await response.text()
-                        return ToolResponse(
-                            result="",
-                            success=False,
-                            error=f"Error from OpenAI API (status {response.status}): {error_text}"
-                        )
-                        
         except Exception as e:
             return ToolResponse(
                 result="",
@@ -343,4 +524,4 @@ class ToolsServer:
 
 
 # Create the deployment
-tools_deployment = ToolsServer.bind() 
\ No newline at end of file
+tools_deployment = ToolsServer.bind(LocalToolsServer.bind()) 
\ No newline at end of file